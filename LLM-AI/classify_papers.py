@@ -1,20 +1,39 @@
 import pandas as pd
-from openai import OpenAI
-import time
+from openai import AsyncOpenAI
+from aiolimiter import AsyncLimiter
+import asyncio
 import json
 import os
 import glob
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 # Configuration for API Key and Base URL
 # Please replace 'YOUR_API_KEY' with your actual API key
 API_KEY = "YOUR_API_KEY"
 BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
-client = OpenAI(
+client = AsyncOpenAI(
     api_key=API_KEY,
     base_url=BASE_URL,
 )
 
+# Concurrency limits: number of in-flight requests and provider requests per minute
+MAX_CONCURRENCY = 16
+REQUESTS_PER_MINUTE = 60
+
+# Titles per LLM call; larger prompts are split once they exceed the token budget
+BATCH_SIZE = 40
+MAX_PROMPT_TOKENS = 6000
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Title -> category log shared by all conference files, replayed on every run
+CACHE_PATH = os.path.join(".cache", "ai_categories.jsonl")
+
 # Define categories
 CATEGORIES = [
     "Machine Learning (including Deep Learning)",
@@ -28,14 +47,34 @@ CATEGORIES = [
     "Interpretability, Fairness, and Applied Systems"
 ]
 
-def clean_title(title):
-    if not isinstance(title, str):
-        return str(title)
-    return title.replace('\\', ' ').replace('"', "'").replace('\n', ' ').strip()
+def read_csv(file_path):
+    if pa is not None:
+        return pd.read_csv(file_path, engine='pyarrow')
+    return pd.read_csv(file_path)
 
-def get_classifications(titles):
-    cleaned_titles = [clean_title(t) for t in titles]
-    
+def write_csv(df, file_path):
+    with open(file_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+        df.to_csv(f, index=False)
+
+def clean_titles(titles):
+    return (
+        titles.astype(str)
+        .str.replace('\\', ' ', regex=False)
+        .str.replace('"', "'", regex=False)
+        .str.replace('\n', ' ', regex=False)
+        .str.strip()
+    )
+
+def parse_index(item):
+    try:
+        return int(item.get('index'))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+def build_prompt(titles):
     prompt = f"""
 As an AI expert, please classify the following papers into one of the categories below.
 Select strictly from the provided list:
@@ -44,31 +83,51 @@ Select strictly from the provided list:
 Return the result in JSON format as follows:
 {{
     "results": [
-        {{"title": "Paper Title 1", "category": "Category Name"}},
+        {{"index": 1, "title": "Paper Title 1", "category": "Category Name"}},
         ...
     ]
 }}
 
 Note:
-1. The "title" field in the JSON must match the provided title exactly (including symbols).
-2. If the title contains LaTeX formulas or special characters, keep them as is. Do not escape or modify them to ensure valid JSON.
+1. The "index" field must be the number given before the title in the list below.
+2. The "title" field in the JSON must match the provided title exactly (including symbols).
+3. If the title contains LaTeX formulas or special characters, keep them as is. Do not escape or modify them to ensure valid JSON.
 
 Papers to classify:
 """
-    for i, title in enumerate(cleaned_titles):
+    for i, title in enumerate(titles):
         prompt += f"{i+1}. {title}\n"
+    return prompt
+
+async def get_classifications(titles, semaphore, limiter):
+    prompt = build_prompt(titles)
+
+    if len(titles) > 1 and estimate_tokens(prompt) > MAX_PROMPT_TOKENS:
+        mid = len(titles) // 2
+        first, second = await asyncio.gather(
+            get_classifications(titles[:mid], semaphore, limiter),
+            get_classifications(titles[mid:], semaphore, limiter),
+        )
+        if not first or not second:
+            return []
+        for item in second:
+            index = parse_index(item)
+            if index is not None:
+                item['index'] = index + mid
+        return first + second
 
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            completion = client.chat.completions.create(
-                model="deepseek-v3",
-                messages=[
-                    {'role': 'user', 'content': prompt}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
+            async with semaphore, limiter:
+                completion = await client.chat.completions.create(
+                    model="deepseek-v3",
+                    messages=[
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    temperature=0.1,
+                    response_format={"type": "json_object"}
+                )
             
             content = completion.choices[0].message.content
             
@@ -89,74 +148,74 @@ Papers to classify:
         if attempt < max_retries - 1:
             wait_time = 2 * (attempt + 1)
             print(f"Waiting {wait_time} seconds before retrying...")
-            time.sleep(wait_time)
+            await asyncio.sleep(wait_time)
             
     return []
 
-def process_file(file_path):
-    print(f"\n{'='*50}")
-    print(f"Processing file: {os.path.basename(file_path)}")
-    print(f"{'='*50}")
+def match_categories(batch_titles, results):
+    title_to_category = {item.get('title'): item.get('category') for item in results}
+    index_to_category = {parse_index(item): item.get('category') for item in results}
+    # Position is only trusted when the model echoed no indices and returned every title
+    use_position = None in index_to_category and len(index_to_category) == 1 and len(results) == len(batch_titles)
+    categories = {}
     
-    print(f"Reading file {file_path}...")
-    df = pd.read_csv(file_path)
-    
-    if 'ai_category' not in df.columns:
-        df['ai_category'] = None
+    for position, title in enumerate(batch_titles):
+        category = index_to_category.get(position + 1)
 
-    pending_mask = df['ai_category'].isna()
-    pending_indices = df[pending_mask].index.tolist()
-    
-    total_pending = len(pending_indices)
-    print(f"Total papers pending classification: {total_pending}")
-    
-    if total_pending == 0:
-        print("All papers in this file have been classified!")
-        return
+        if not category:
+            category = title_to_category.get(title)
 
-    batch_size = 5
-    save_interval = 10 
-    
-    for i in range(0, total_pending, batch_size):
-        current_batch_indices = pending_indices[i : i + batch_size]
-        batch_titles = df.loc[current_batch_indices, 'title'].tolist()
-        print(f"Processing {i+1} to {min(i+batch_size, total_pending)} (Progress: {i}/{total_pending})...")
-        
-        results = get_classifications(batch_titles)
+        if not category and use_position:
+            category = results[position].get('category')
         
-        if results and len(results) > 0:
-            title_to_category = {item['title']: item['category'] for item in results}
+        if category:
+            categories[title] = category
             
-            for idx, title in zip(current_batch_indices, batch_titles):
-                cleaned_title = clean_title(title)
-                category = title_to_category.get(title)
-                
-                if not category:
-                    category = title_to_category.get(cleaned_title)
-
-                if not category:
-                    try:
-                        relative_index = current_batch_indices.index(idx)
-                        if relative_index < len(results):
-                            category = results[relative_index].get('category')
-                    except ValueError:
-                        pass
-                
-                if category:
-                     df.at[idx, 'ai_category'] = category
-        else:
-            print(f"Warning: No valid results obtained for this batch.")
+    return categories
+
+def load_cache(cache_path):
+    cache = {}
+    if not os.path.exists(cache_path):
+        return cache
         
-        if (i // batch_size + 1) % save_interval == 0:
-            print("Saving intermediate results to source file...")
-            df.to_csv(file_path, index=False)
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                cache[entry['title']] = entry['ai_category']
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return cache
+
+async def classify_batch(batch_titles, semaphore, limiter):
+    results = await get_classifications(batch_titles, semaphore, limiter)
+    return batch_titles, results
+
+async def classify_titles(titles, cache, cache_path):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    limiter = AsyncLimiter(REQUESTS_PER_MINUTE, 60)
+
+    tasks = [
+        asyncio.create_task(classify_batch(titles[i : i + BATCH_SIZE], semaphore, limiter))
+        for i in range(0, len(titles), BATCH_SIZE)
+    ]
+    print(f"Submitted {len(tasks)} batches (concurrency: {MAX_CONCURRENCY}, limit: {REQUESTS_PER_MINUTE} requests/min)...")
+    
+    with open(cache_path, 'a', encoding='utf-8') as cache_file:
+        for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+            batch_titles, results = await task
+            print(f"Completed batch {completed}/{len(tasks)}...")
             
-        time.sleep(1)
-        
-    df.to_csv(file_path, index=False)
-    print(f"File processing complete! Results updated in: {file_path}")
+            if results and len(results) > 0:
+                categories = match_categories(batch_titles, results)
+                for title, category in categories.items():
+                    cache_file.write(json.dumps({"title": title, "ai_category": category}, ensure_ascii=False) + "\n")
+                cache_file.flush()
+                cache.update(categories)
+            else:
+                print(f"Warning: No valid results obtained for this batch.")
 
-def main():
+async def main():
     data_dir = "./data"
     
     if not os.path.exists(data_dir):
@@ -166,11 +225,51 @@ def main():
     csv_files = glob.glob(os.path.join(data_dir, "*.final.csv"))
     
     print(f"Found {len(csv_files)} conference files to check/process...")
+
+    frames = {}
+    cleaned = {}
+    for file_path in csv_files:
+        print(f"Reading file {file_path}...")
+        df = read_csv(file_path)
+        if 'ai_category' not in df.columns:
+            df['ai_category'] = None
+        frames[file_path] = df
+        cleaned[file_path] = clean_titles(df['title'])
+
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    cache = load_cache(CACHE_PATH)
+    print(f"Loaded {len(cache)} cached classifications from {CACHE_PATH}")
+
+    all_titles = pd.concat(
+        [pd.DataFrame({'title': cleaned[f], 'ai_category': frames[f]['ai_category']}) for f in csv_files],
+        ignore_index=True,
+    )
+    classified = all_titles.dropna(subset=['ai_category']).drop_duplicates(subset='title')
+    known = dict(zip(classified['title'], classified['ai_category']))
+    known.update(cache)
+
+    pending = all_titles.loc[all_titles['ai_category'].isna(), 'title'].drop_duplicates()
+    pending = pending[~pending.isin(list(known))].tolist()
+    
+    print(f"Papers pending classification: {int(all_titles['ai_category'].isna().sum())}, unique titles to classify: {len(pending)}")
     
+    if pending:
+        await classify_titles(pending, known, CACHE_PATH)
+
     for file_path in csv_files:
-        process_file(file_path)
+        df = frames[file_path]
+        missing = df['ai_category'].isna()
+        if not missing.any():
+            print(f"All papers in {os.path.basename(file_path)} have been classified!")
+            continue
+            
+        df['ai_category'] = df['ai_category'].fillna(cleaned[file_path].map(known))
+        filled = int(missing.sum() - df['ai_category'].isna().sum())
+        if filled:
+            write_csv(df, file_path)
+        print(f"Updated {filled} papers in: {file_path}")
 
     print("\nAll files processed!")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
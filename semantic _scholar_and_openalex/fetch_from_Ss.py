@@ -1,94 +1,143 @@
 import os
-import csv
+import json
+import re
 import yaml
-import time
-import requests
-import concurrent.futures
+import asyncio
+import aiohttp
+import numpy as np
+import pandas as pd
+from aiolimiter import AsyncLimiter
+from diskcache import Cache
 from pathlib import Path
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 API_KEY = "YOUR_API_KEY_HERE"
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 DATA_FALSE_DIR = BASE_DIR / "data-false"
 CONFIG_FILE = BASE_DIR / "config" / "venues_top.yaml"
+CACHE_DIR = BASE_DIR / ".cache" / "semantic_scholar"
 
 HEADERS = {"x-api-key": API_KEY}
 
-def request_with_retry(url, params=None, max_retries=5):
-    for i in range(max_retries):
+FIRST_YEAR = 2014
+LAST_YEAR = 2024
+
+# Standard Semantic Scholar API keys allow about 1 request per second; raise for higher-limit keys
+REQUESTS_PER_SECOND = 1
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CACHE_EXPIRE = 30 * 86400
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+rate_limiter = AsyncLimiter(REQUESTS_PER_SECOND, 1)
+semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+cache = None
+
+class RequestFailedError(Exception):
+    pass
+
+def get_cache():
+    global cache
+    if cache is None:
+        cache = Cache(str(CACHE_DIR))
+    return cache
+
+async def request_with_retry(session, url, params=None):
+    cache_key = (url, tuple(sorted((params or {}).items())))
+    data = get_cache().get(cache_key)
+    if data is not None:
+        return data
+        
+    for attempt in range(MAX_RETRIES):
+        wait_time = 2 ** attempt
         try:
-            response = requests.get(url, params=params, headers=HEADERS, timeout=15)
-            if response.status_code == 200:
-                return response
-            elif response.status_code == 429:
-                wait_time = 5 * (i + 1)
-                print(f"Rate limit exceeded (429). Waiting {wait_time}s... (Attempt {i+1}/{max_retries})")
-                time.sleep(wait_time)
-                continue
-            elif 500 <= response.status_code < 600:
-                print(f"Server error ({response.status_code}). Retrying... (Attempt {i+1}/{max_retries})")
-                time.sleep(2)
-                continue
-            else:
-                return response
-        except requests.exceptions.RequestException as e:
-            print(f"Network error: {e}. Retrying... (Attempt {i+1}/{max_retries})")
-            time.sleep(2)
+            async with semaphore, rate_limiter:
+                async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        get_cache().set(cache_key, data, expire=CACHE_EXPIRE)
+                        return data
+                    if response.status not in RETRY_STATUSES:
+                        print(f"Request failed: {response.status} - {await response.text()}")
+                        return None
+                    if response.status == 429:
+                        wait_time = 5 * (attempt + 1)
+                        retry_after = response.headers.get('Retry-After')
+                        if retry_after and retry_after.isdigit():
+                            wait_time = max(wait_time, int(retry_after))
+                        print(f"Rate limit exceeded (429). Waiting {wait_time}s... (Attempt {attempt + 1}/{MAX_RETRIES})")
+                    else:
+                        print(f"Server error ({response.status}). Retrying... (Attempt {attempt + 1}/{MAX_RETRIES})")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Network error: {e}. Retrying... (Attempt {attempt + 1}/{MAX_RETRIES})")
+        await asyncio.sleep(wait_time)
             
-    print(f"Failed to fetch {url} after {max_retries} attempts.")
-    return None
+    raise RequestFailedError(f"Failed to fetch {url} after {MAX_RETRIES} attempts.")
 
 def load_config():
     if not CONFIG_FILE.exists():
         print(f"Config file not found: {CONFIG_FILE}")
-        return set(), set()
+        return build_venue_automaton([], [])
 
     with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
     
-    top_confs = set(conf.lower() for conf in config.get('top_conferences', []))
-    top_journals = set(jour.lower() for jour in config.get('top_journals', []))
-    
-    return top_confs, top_journals
+    return build_venue_automaton(config.get('top_conferences', []), config.get('top_journals', []))
+
+def compile_venue_pattern(names):
+    if not names:
+        return None
+    return re.compile('|'.join(re.escape(name.lower()) for name in names))
 
-def search_paper(title):
+def build_venue_automaton(top_confs, top_journals):
+    if ahocorasick is None:
+        return compile_venue_pattern(top_confs), compile_venue_pattern(top_journals)
+        
+    automaton = ahocorasick.Automaton()
+    for jour in top_journals:
+        automaton.add_word(jour.lower(), 'journal')
+    for conf in top_confs:
+        automaton.add_word(conf.lower(), 'conf')
+    automaton.make_automaton()
+    return automaton
+
+async def search_paper(session, title):
     url = "https://api.semanticscholar.org/graph/v1/paper/search"
     params = {
         "query": title,
         "limit": 1,
-        "fields": "paperId,title,year"
+        "fields": "paperId,title,year,citationCount"
     }
     
-    response = request_with_retry(url, params)
+    data = await request_with_retry(session, url, params)
     
-    if response and response.status_code == 200:
-        data = response.json()
-        if data.get('data'):
-            return data['data'][0]
-    elif response:
-        print(f"Error searching paper: {response.status_code} - {response.text}")
+    if data and data.get('data'):
+        return data['data'][0]
         
     return None
 
-def get_citations(paper_id):
+async def get_citations(session, paper_id, total=None):
     citations = []
     offset = 0
     limit = 1000
-    total = 0
-    
-    detail_url = f"https://api.semanticscholar.org/graph/v1/paper/{paper_id}"
-    r = request_with_retry(detail_url, params={"fields": "citationCount"})
-    
-    if r and r.status_code == 200:
-        total = r.json().get('citationCount', 0)
-    else:
-        return [], 0
 
     if total == 0:
         return [], 0
 
-    print(f"Fetching {total} citations for paper {paper_id}...")
+    print(f"Fetching {total if total is not None else 'all'} citations for paper {paper_id}...")
     
     while True:
         url = f"https://api.semanticscholar.org/graph/v1/paper/{paper_id}/citations"
@@ -98,10 +147,11 @@ def get_citations(paper_id):
             "limit": limit
         }
         
-        response = request_with_retry(url, params)
+        data = await request_with_retry(session, url, params)
         
-        if response and response.status_code == 200:
-            data = response.json()
+        if data:
+            if total is None:
+                total = data.get('total')
             batch = data.get('data', [])
             if not batch:
                 break
@@ -109,69 +159,117 @@ def get_citations(paper_id):
             citations.extend(batch)
             offset += len(batch)
             
-            if offset >= total or len(batch) < limit:
+            if (total is not None and offset >= total) or len(batch) < limit:
                 break
-            
-            time.sleep(1.0)
         else:
-            print(f"Error fetching citations page.")
-            break
+            raise RequestFailedError(f"Error fetching citations page for paper {paper_id} at offset {offset}.")
             
-    return citations, total
+    return citations, total if total is not None else len(citations)
 
-def is_top_venue(venue_name, top_list):
+def classify_venue(venue_name, top_venues):
     if not venue_name:
-        return False
+        return None
     v = venue_name.lower()
-    for top in top_list:
-        if top in v:
-            return True
-    return False
+    
+    if ahocorasick is None:
+        conf_pattern, journal_pattern = top_venues
+        if conf_pattern and conf_pattern.search(v):
+            return 'conf'
+        if journal_pattern and journal_pattern.search(v):
+            return 'journal'
+        return None
+        
+    if len(top_venues) == 0:
+        return None
+    tag = None
+    for _, kind in top_venues.iter(v):
+        if kind == 'conf':
+            return 'conf'
+        tag = kind
+    return tag
 
-def process_single_row(row, top_confs, top_journals):
-    title = row.get('title')
-    if not title:
-        return None, None
+def count_years(years):
+    years = np.asarray(years, dtype=np.int64)
+    years = years[(years >= FIRST_YEAR) & (years <= LAST_YEAR)]
+    counts = np.bincount(years - FIRST_YEAR, minlength=LAST_YEAR - FIRST_YEAR + 1)
+    return {FIRST_YEAR + i: int(count) for i, count in enumerate(counts)}
 
-    paper_info = search_paper(title)
+async def process_single_row(session, title, top_venues):
+    paper_info = await search_paper(session, title)
     
-    if paper_info:
-        paper_id = paper_info['paperId']
-        row['paperId'] = paper_id
-        
-        citations, count = get_citations(paper_id)
-        row['citationCount'] = count
+    if not paper_info:
+        return None
         
-        top_conf_count = 0
-        top_journal_count = 0
-        year_counts = {y: 0 for y in range(2014, 2025)}
-        
-        for cit in citations:
-            citing_paper = cit.get('citingPaper', {})
-            if not citing_paper:
-                continue
-                
-            year = citing_paper.get('year')
-            if year and 2014 <= year <= 2024:
-                year_counts[year] += 1
+    paper_id = paper_info['paperId']
+    citations, count = await get_citations(session, paper_id, paper_info.get('citationCount'))
+    
+    top_conf_count = 0
+    top_journal_count = 0
+    years = []
+    
+    for cit in citations:
+        citing_paper = cit.get('citingPaper', {})
+        if not citing_paper:
+            continue
             
-            venue = citing_paper.get('venue')
-            if is_top_venue(venue, top_confs):
-                top_conf_count += 1
-            elif is_top_venue(venue, top_journals):
-                top_journal_count += 1
+        year = citing_paper.get('year')
+        if year:
+            years.append(year)
         
-        row['top_conf_citations'] = top_conf_count
-        row['top_journal_citations'] = top_journal_count
-        for year in range(2014, 2025):
-            row[f'citations_{year}'] = year_counts[year]
+        venue_tag = classify_venue(citing_paper.get('venue'), top_venues)
+        if venue_tag == 'conf':
+            top_conf_count += 1
+        elif venue_tag == 'journal':
+            top_journal_count += 1
+    
+    updates = {
+        'paperId': paper_id,
+        'citationCount': count,
+        'top_conf_citations': top_conf_count,
+        'top_journal_citations': top_journal_count,
+    }
+    for year, year_count in count_years(years).items():
+        updates[f'citations_{year}'] = year_count
+    
+    return updates
+
+def read_csv(file_path):
+    if pa is not None:
+        return pd.read_csv(file_path, engine='pyarrow', dtype=str, keep_default_na=False)
+    return pd.read_csv(file_path, dtype=str, keep_default_na=False)
+
+def write_csv(df, file_path):
+    with open(file_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+        df.to_csv(f, index=False)
+
+def apply_updates(df, updates):
+    if updates:
+        df.update(pd.DataFrame.from_dict(updates, orient='index').astype(str))
+
+def load_progress(progress_path):
+    updates = {}
+    if not progress_path.exists():
+        return updates
         
-        return row, True
-    else:
-        return row, False
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                updates[entry.pop('idx')] = entry
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return updates
 
-def process_files():
-    top_confs, top_journals = load_config()
+async def process_row(session, idx, title, top_venues):
+    try:
+        updates = await process_single_row(session, title, top_venues)
+        return idx, title, updates, updates is not None
+    except Exception as exc:
+        print(f"Row {idx} generated an exception: {exc}")
+        return idx, title, None, None
+
+async def process_files():
+    top_venues = load_config()
     
     if not DATA_DIR.exists():
         print(f"Data directory not found: {DATA_DIR}")
@@ -179,79 +277,69 @@ def process_files():
 
     files = [f for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
     
-    for filename in files:
-        file_path = DATA_DIR / filename
-        false_file_path = DATA_FALSE_DIR / filename.replace('.csv', '.txt')
-        
-        DATA_FALSE_DIR.mkdir(parents=True, exist_ok=True)
-        
-        print(f"\nProcessing file: {filename}")
-        
-        not_found_papers = []
-        fieldnames = []
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            rows = list(reader)
-        
-        if false_file_path.exists():
-            with open(false_file_path, 'r', encoding='utf-8') as f:
-                not_found_papers = [line.strip() for line in f.readlines()]
+    connector = aiohttp.TCPConnector(limit=64, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        for filename in files:
+            await process_file(session, filename, top_venues)
 
-        total_rows = len(rows)
-        batch_size = 10
-        max_workers = 3
-        
-        indices_to_process = []
-        for i, row in enumerate(rows):
-            if row.get('title') and not (row.get('paperId') and row.get('citationCount')):
-                indices_to_process.append(i)
-        
-        print(f"Total rows: {total_rows}, Rows to process: {len(indices_to_process)}")
+async def process_file(session, filename, top_venues):
+    file_path = DATA_DIR / filename
+    false_file_path = DATA_FALSE_DIR / filename.replace('.csv', '.txt')
+    progress_path = DATA_DIR / f"{filename}.progress.jsonl"
+    
+    DATA_FALSE_DIR.mkdir(parents=True, exist_ok=True)
+    
+    print(f"\nProcessing file: {filename}")
+    
+    not_found_papers = {}
+    df = read_csv(file_path)
+    
+    restored = load_progress(progress_path)
+    apply_updates(df, restored)
+    if restored:
+        print(f"Restored {len(restored)} rows from {progress_path.name}")
+    
+    if false_file_path.exists():
+        with open(false_file_path, 'r', encoding='utf-8') as f:
+            not_found_papers = dict.fromkeys(line.strip() for line in f.readlines() if line.strip())
 
-        for i in range(0, len(indices_to_process), batch_size):
-            batch_indices = indices_to_process[i:i + batch_size]
-            
-            print(f"Processing batch {i//batch_size + 1}/{(len(indices_to_process) + batch_size - 1)//batch_size} (Rows {batch_indices[0]+1}-{batch_indices[-1]+1})...")
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_index = {
-                    executor.submit(process_single_row, rows[idx], top_confs, top_journals): idx 
-                    for idx in batch_indices
-                }
-                
-                for future in concurrent.futures.as_completed(future_to_index):
-                    idx = future_to_index[future]
-                    try:
-                        updated_row, found = future.result()
-                        if updated_row:
-                            rows[idx] = updated_row
-                            title = updated_row.get('title')
-                            
-                            if found:
-                                print(f"  [✓] Found: {title[:40]}...")
-                                if title in not_found_papers:
-                                    not_found_papers.remove(title)
-                            else:
-                                print(f"  [x] Not Found: {title[:40]}...")
-                                if title not in not_found_papers:
-                                    not_found_papers.append(title)
-                    except Exception as exc:
-                        print(f"Row {idx} generated an exception: {exc}")
-
-            print(f"Saving progress after batch...")
-            with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-            if not_found_papers:
-                with open(false_file_path, 'w', encoding='utf-8') as f:
-                    for t in not_found_papers:
-                        f.write(f"{t}\n")
+    total_rows = len(df)
+    save_interval = 10
+    
+    pending_mask = (df['title'] != '') & ~((df['paperId'] != '') & (df['citationCount'] != ''))
+    indices_to_process = df.index[pending_mask].tolist()
+    
+    print(f"Total rows: {total_rows}, Rows to process: {len(indices_to_process)}")
+
+    tasks = [process_row(session, idx, df.at[idx, 'title'], top_venues) for idx in indices_to_process]
+    updates = {}
+    
+    with open(progress_path, 'a', encoding='utf-8') as progress_file:
+        for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+            idx, title, row_updates, found = await task
+            if found:
+                print(f"  [✓] Found: {title[:40]}...")
+                updates[idx] = row_updates
+                progress_file.write(json.dumps({"idx": idx, **row_updates}, ensure_ascii=False) + "\n")
+                not_found_papers.pop(title, None)
+            elif found is not None:
+                print(f"  [x] Not Found: {title[:40]}...")
+                not_found_papers[title] = None
+
+            if completed % save_interval == 0 or completed == len(tasks):
+                print(f"Progress: {completed}/{len(tasks)} rows")
+                progress_file.flush()
             
-            time.sleep(1)
+                if not_found_papers:
+                    with open(false_file_path, 'w', encoding='utf-8') as f:
+                        for t in not_found_papers:
+                            f.write(f"{t}\n")
+
+    if updates or restored:
+        print(f"Saving results to {filename}...")
+        apply_updates(df, updates)
+        write_csv(df, file_path)
+    progress_path.unlink(missing_ok=True)
 
 if __name__ == "__main__":
-    process_files()
+    asyncio.run(process_files())
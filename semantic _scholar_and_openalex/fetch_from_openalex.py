@@ -1,120 +1,254 @@
 import os
 import csv
+import math
+import re
 import yaml
-import time
-import requests
-import concurrent.futures
+import asyncio
+import aiohttp
+import ijson
+import numpy as np
+from aiolimiter import AsyncLimiter
+from diskcache import Cache
 from urllib.parse import quote
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process
 from pathlib import Path
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 DATA_FALSE_DIR = BASE_DIR / "data-false"
 CONFIG_FILE = BASE_DIR / "config" / "venues_top.yaml"
+CACHE_DIR = BASE_DIR / ".cache" / "openalex"
+
+# Replace with a real address to be served from OpenAlex's polite pool
+MAILTO = "your_email@example.com"
 
 HEADERS = {
-    "User-Agent": "mailto:your_email@example.com"
+    "User-Agent": f"acl-crown-analysis/1.0 (mailto:{MAILTO})"
 }
 
+OPENALEX_RATE = 9
+MAX_CONCURRENCY = 32
+MAX_RETRIES = 5
+# OpenAlex only serves page-based results up to this offset; larger sets need cursor paging
+MAX_PAGED_RESULTS = 10000
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CACHE_EXPIRE = 30 * 86400
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+FIRST_YEAR = 2014
+LAST_YEAR = 2024
+
+rate_limiter = AsyncLimiter(OPENALEX_RATE, 1)
+semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+cache = None
+
+def get_cache():
+    global cache
+    if cache is None:
+        cache = Cache(str(CACHE_DIR))
+    return cache
+
+async def parse_citations(response):
+    meta = {}
+    results = []
+    year = venue = None
+    
+    async for prefix, event, value in ijson.parse_async(response.content):
+        if prefix == 'meta.count':
+            meta['count'] = value
+        elif prefix == 'meta.next_cursor':
+            meta['next_cursor'] = value
+        elif prefix == 'results.item.publication_year':
+            year = value
+        elif prefix == 'results.item.primary_location.source.display_name':
+            venue = value
+        elif prefix == 'results.item' and event == 'end_map':
+            results.append({'publication_year': year, 'venue': venue})
+            year = venue = None
+            
+    return {'meta': meta, 'results': results}
+
+async def openalex_get(session, url, timeout, parse=None):
+    cache_key = url if parse is None else (parse.__name__, url)
+    data = get_cache().get(cache_key)
+    if data is not None:
+        return data
+        
+    for attempt in range(MAX_RETRIES):
+        wait_time = 0.5 * 2 ** attempt
+        try:
+            async with semaphore, rate_limiter:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    if response.status == 200:
+                        data = await (parse(response) if parse else response.json())
+                        get_cache().set(cache_key, data, expire=CACHE_EXPIRE)
+                        return data
+                    if response.status not in RETRY_STATUSES:
+                        print(f"OpenAlex request failed ({response.status}): {url}")
+                        return None
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after and retry_after.isdigit():
+                        wait_time = max(wait_time, int(retry_after))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Network error: {e}. Retrying... (Attempt {attempt + 1}/{MAX_RETRIES})")
+        await asyncio.sleep(wait_time)
+        
+    print(f"Failed to fetch {url} after {MAX_RETRIES} attempts.")
+    return None
+
 def load_config():
     if not CONFIG_FILE.exists():
         print(f"Config file not found: {CONFIG_FILE}")
-        return set(), set()
+        return build_venue_automaton([], [])
 
     with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
     
-    top_confs = set(conf.lower() for conf in config.get('top_conferences', []))
-    top_journals = set(jour.lower() for jour in config.get('top_journals', []))
-    
-    return top_confs, top_journals
+    return build_venue_automaton(config.get('top_conferences', []), config.get('top_journals', []))
 
-def is_top_venue(venue_name, top_list):
+def compile_venue_pattern(names):
+    if not names:
+        return None
+    return re.compile('|'.join(re.escape(name.lower()) for name in names))
+
+def build_venue_automaton(top_confs, top_journals):
+    if ahocorasick is None:
+        return compile_venue_pattern(top_confs), compile_venue_pattern(top_journals)
+        
+    automaton = ahocorasick.Automaton()
+    for jour in top_journals:
+        automaton.add_word(jour.lower(), 'journal')
+    for conf in top_confs:
+        automaton.add_word(conf.lower(), 'conf')
+    automaton.make_automaton()
+    return automaton
+
+def classify_venue(venue_name, top_venues):
     if not venue_name:
-        return False
+        return None
     v = venue_name.lower()
-    for top in top_list:
-        if top in v:
-            return True
-    return False
+    
+    if ahocorasick is None:
+        conf_pattern, journal_pattern = top_venues
+        if conf_pattern and conf_pattern.search(v):
+            return 'conf'
+        if journal_pattern and journal_pattern.search(v):
+            return 'journal'
+        return None
+        
+    if len(top_venues) == 0:
+        return None
+    tag = None
+    for _, kind in top_venues.iter(v):
+        if kind == 'conf':
+            return 'conf'
+        tag = kind
+    return tag
 
-def calculate_similarity(a, b):
+def max_similarity(a, b):
+    # Upper bound of fuzz.ratio given only the two lengths
     if not a or not b:
         return 0.0
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    return 2 * min(len(a), len(b)) / (len(a) + len(b))
 
-def search_openalex(title):
+async def search_openalex(session, title):
     encoded_title = quote(title)
     url = f"https://api.openalex.org/works?filter=title.search:{encoded_title}&per-page=5" 
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        if response.status_code == 200:
-            data = response.json()
+        data = await openalex_get(session, url, timeout=15)
+        if data:
             results = data.get('results', [])
             
             if not results:
                 return None
                 
-            best_match = None
-            highest_similarity = 0.0
             threshold = 0.85 
+            candidates = {}
+            for i, result in enumerate(results):
+                result_title = result.get('display_name') or ''
+                if max_similarity(title, result_title) >= threshold:
+                    candidates[i] = result_title.lower()
             
-            for result in results:
-                result_title = result.get('display_name', '')
-                similarity = calculate_similarity(title, result_title)
-                
-                if similarity > highest_similarity:
-                    highest_similarity = similarity
-                    best_match = result
-            
-            if highest_similarity >= threshold:
-                return best_match
-            else:
-                pass
+            match = process.extractOne(
+                title.lower(), candidates, scorer=fuzz.ratio, score_cutoff=threshold * 100
+            )
+            if match:
+                return results[match[2]]
                 
     except Exception as e:
         print(f"Error searching OpenAlex for '{title}': {e}")
         
     return None
 
-def get_citations_from_openalex(work_id):
-    citations_data = [] 
-    short_id = work_id.split('/')[-1]
-    page = 1
-    per_page = 200 
+async def fetch_citations_page(session, short_id, page, per_page):
+    url = f"https://api.openalex.org/works?filter=cites:{short_id}&per-page={per_page}&page={page}&select=publication_year,primary_location"
+    return await openalex_get(session, url, timeout=20, parse=parse_citations)
+
+async def walk_citations_cursor(session, short_id, per_page):
+    citations_data = []
+    cursor = "*"
     
-    while True:
-        url = f"https://api.openalex.org/works?filter=cites:{short_id}&per-page={per_page}&page={page}&select=publication_year,primary_location"
+    while cursor:
+        url = f"https://api.openalex.org/works?filter=cites:{short_id}&per-page={per_page}&cursor={quote(cursor, safe='')}&select=publication_year,primary_location"
+        data = await openalex_get(session, url, timeout=20, parse=parse_citations)
+        if not data:
+            print(f"Error walking citations for {short_id}: cursor page failed after {len(citations_data)} works.")
+            return None
         
-        try:
-            response = requests.get(url, headers=HEADERS, timeout=20)
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get('results', [])
-                if not results:
-                    break
-                
-                citations_data.extend(results)
-                meta = data.get('meta', {})
-                count = meta.get('count', 0)
-                if len(citations_data) >= count:
-                    break
-                
-                page += 1
-                time.sleep(0.5) 
-            else:
-                print(f"Error fetching citations: {response.status_code}")
-                break
-        except Exception as e:
-            print(f"Error fetching citations: {e}")
+        results = data.get('results', [])
+        if not results:
             break
+        
+        citations_data.extend(results)
+        cursor = data.get('meta', {}).get('next_cursor')
+        
+    return citations_data
+
+async def get_citations_from_openalex(session, work_id, citation_count):
+    short_id = work_id.split('/')[-1]
+    per_page = 200 
+    
+    if citation_count > MAX_PAGED_RESULTS:
+        return await walk_citations_cursor(session, short_id, per_page)
+    
+    data = await fetch_citations_page(session, short_id, 1, per_page)
+    if not data:
+        print(f"Error fetching citations for {work_id}: first page failed.")
+        return None
+    
+    citations_data = list(data.get('results', []))
+    count = data.get('meta', {}).get('count', 0)
+    n_pages = math.ceil(min(count, MAX_PAGED_RESULTS) / per_page)
+    
+    if n_pages > 1:
+        pages = await asyncio.gather(*(
+            fetch_citations_page(session, short_id, page, per_page)
+            for page in range(2, n_pages + 1)
+        ))
+        failed_pages = sum(1 for page_data in pages if not page_data)
+        if failed_pages:
+            print(f"Error fetching citations for {work_id}: {failed_pages}/{n_pages} pages failed.")
+            return None
+        for page_data in pages:
+            citations_data.extend(page_data.get('results', []))
             
     return citations_data
 
-def process_single_paper(title, top_confs, top_journals):
-    paper = search_openalex(title)
+def count_years(years):
+    years = np.asarray(years, dtype=np.int64)
+    years = years[(years >= FIRST_YEAR) & (years <= LAST_YEAR)]
+    counts = np.bincount(years - FIRST_YEAR, minlength=LAST_YEAR - FIRST_YEAR + 1)
+    return {FIRST_YEAR + i: int(count) for i, count in enumerate(counts)}
+
+async def process_single_paper(session, title, top_venues):
+    paper = await search_openalex(session, title)
     
     if not paper:
         return None
@@ -126,40 +260,45 @@ def process_single_paper(title, top_confs, top_journals):
             'citationCount': 0,
             'top_conf_citations': 0,
             'top_journal_citations': 0,
-            'year_counts': {y: 0 for y in range(2014, 2025)}
+            'year_counts': count_years([])
         }
 
-    citing_works = get_citations_from_openalex(work_id)
+    citing_works = await get_citations_from_openalex(session, work_id, citation_count)
+    if citing_works is None:
+        return None
     
     top_conf_count = 0
     top_journal_count = 0
-    year_counts = {y: 0 for y in range(2014, 2025)}
+    years = []
     
     for work in citing_works:
         year = work.get('publication_year')
-        if year and 2014 <= year <= 2024:
-            year_counts[year] += 1
+        if year:
+            years.append(year)
             
-        loc = work.get('primary_location') or {}
-        source = loc.get('source') or {}
-        display_name = source.get('display_name')
-        
-        if display_name:
-            if is_top_venue(display_name, top_confs):
-                top_conf_count += 1
-            elif is_top_venue(display_name, top_journals):
-                top_journal_count += 1
+        venue_tag = classify_venue(work.get('venue'), top_venues)
+        if venue_tag == 'conf':
+            top_conf_count += 1
+        elif venue_tag == 'journal':
+            top_journal_count += 1
                 
     return {
         'paperId': work_id, 
         'citationCount': citation_count,
         'top_conf_citations': top_conf_count,
         'top_journal_citations': top_journal_count,
-        'year_counts': year_counts
+        'year_counts': count_years(years)
     }
 
-def process_false_files():
-    top_confs, top_journals = load_config()
+async def search_title(session, title, top_venues):
+    try:
+        return title, await process_single_paper(session, title, top_venues)
+    except Exception as e:
+        print(f"Error processing {title}: {e}")
+        return title, None
+
+async def process_false_files():
+    top_venues = load_config()
     
     if not DATA_FALSE_DIR.exists():
         print(f"False data directory not found: {DATA_FALSE_DIR}")
@@ -167,75 +306,73 @@ def process_false_files():
 
     txt_files = [f for f in os.listdir(DATA_FALSE_DIR) if f.endswith('.txt')]
     
-    for txt_file in txt_files:
-        print(f"\nProcessing false file: {txt_file}")
-        txt_path = DATA_FALSE_DIR / txt_file
-        csv_file = txt_file.replace('.txt', '.csv')
-        csv_path = DATA_DIR / csv_file
-        
-        if not csv_path.exists():
-            print(f"Warning: Corresponding CSV file {csv_file} not found.")
-            continue
-            
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            titles_to_search = [line.strip() for line in f.readlines() if line.strip()]
-            
-        if not titles_to_search:
-            print("No titles to search in this file.")
-            continue
-            
-        print(f"Found {len(titles_to_search)} titles to retry with OpenAlex.")
-        
-        rows = []
-        fieldnames = []
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            rows = list(reader)
+    connector = aiohttp.TCPConnector(limit=64, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        for txt_file in txt_files:
+            await process_false_file(session, txt_file, top_venues)
+
+async def process_false_file(session, txt_file, top_venues):
+    print(f"\nProcessing false file: {txt_file}")
+    txt_path = DATA_FALSE_DIR / txt_file
+    csv_file = txt_file.replace('.txt', '.csv')
+    csv_path = DATA_DIR / csv_file
+    
+    if not csv_path.exists():
+        print(f"Warning: Corresponding CSV file {csv_file} not found.")
+        return
         
-        titles_found = []
-        max_workers = 5
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        titles_to_search = [line.strip() for line in f.readlines() if line.strip()]
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_title = {
-                executor.submit(process_single_paper, title, top_confs, top_journals): title
-                for title in titles_to_search
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_title):
-                title = future_to_title[future]
-                try:
-                    result = future.result()
-                    if result:
-                        print(f"  [✓] Found in OpenAlex: {title[:40]}...")
-                        titles_found.append(title)
-                        for row in rows:
-                            if row['title'].strip() == title.strip():
-                                row['paperId'] = result['paperId']
-                                row['citationCount'] = result['citationCount']
-                                row['top_conf_citations'] = result['top_conf_citations']
-                                row['top_journal_citations'] = result['top_journal_citations']
-                                for year, count in result['year_counts'].items():
-                                    row[f'citations_{year}'] = count
-                                break
-                    else:
-                        print(f"  [x] Not found in OpenAlex: {title[:40]}...")
-                except Exception as e:
-                    print(f"Error processing {title}: {e}")
+    if not titles_to_search:
+        print("No titles to search in this file.")
+        return
         
-        if titles_found:
-            print(f"Updating {csv_file} with {len(titles_found)} new records...")
-            with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            remaining_titles = [t for t in titles_to_search if t not in titles_found]
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                for t in remaining_titles:
-                    f.write(f"{t}\n")
-            print(f"Removed found titles from {txt_file}. Remaining: {len(remaining_titles)}")
+    print(f"Found {len(titles_to_search)} titles to retry with OpenAlex.")
+    
+    rows = []
+    fieldnames = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    
+    title_index = {}
+    for i, row in enumerate(rows):
+        title_index.setdefault(row['title'].strip(), i)
+    titles_found = set()
+    
+    tasks = [search_title(session, title, top_venues) for title in titles_to_search]
+    for task in asyncio.as_completed(tasks):
+        title, result = await task
+        if result:
+            print(f"  [✓] Found in OpenAlex: {title[:40]}...")
+            titles_found.add(title)
+            i = title_index.get(title.strip())
+            if i is not None:
+                row = rows[i]
+                row['paperId'] = result['paperId']
+                row['citationCount'] = result['citationCount']
+                row['top_conf_citations'] = result['top_conf_citations']
+                row['top_journal_citations'] = result['top_journal_citations']
+                for year, count in result['year_counts'].items():
+                    row[f'citations_{year}'] = count
         else:
-            print("No new papers found.")
+            print(f"  [x] Not found in OpenAlex: {title[:40]}...")
+    
+    if titles_found:
+        print(f"Updating {csv_file} with {len(titles_found)} new records...")
+        with open(csv_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        remaining_titles = [t for t in titles_to_search if t not in titles_found]
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            for t in remaining_titles:
+                f.write(f"{t}\n")
+        print(f"Removed found titles from {txt_file}. Remaining: {len(remaining_titles)}")
+    else:
+        print("No new papers found.")
 
 if __name__ == "__main__":
-    process_false_files()
+    asyncio.run(process_false_files())